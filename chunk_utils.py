@@ -0,0 +1,154 @@
+'''
+Array and window helpers for chunks.py that don't depend on GDAL.
+'''
+
+import numpy as np
+import threading
+from collections import defaultdict
+
+
+class BufferPool:
+    '''
+    Holds released numpy arrays for reuse, keyed by shape and dtype, so repeated chunk reads don't pay for a fresh
+    allocation (and first-touch page faults) each time. At most max_per_key arrays are kept for each shape and dtype,
+    and at most max_bytes in total; arrays released beyond those limits are dropped.
+    '''
+
+    def __init__(self, max_per_key=4, max_bytes=1024 ** 3):
+        self.max_per_key = max_per_key
+        self.max_bytes = max_bytes
+        self.free_arrays = defaultdict(list)
+        self.pooled_bytes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, shape, dtype):
+        '''
+        Returns a released array of shape and dtype if one is available, or a new uninitialized array otherwise.
+        '''
+
+        key = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            free_arrays = self.free_arrays.get(key)
+            if free_arrays:
+                array = free_arrays.pop()
+                if not free_arrays:
+                    del self.free_arrays[key]
+                self.pooled_bytes -= array.nbytes
+                return array
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, array):
+        '''
+        Returns array to the pool, unless the pool is full. The caller must not use array afterwards.
+        '''
+
+        key = (array.shape, array.dtype)
+        with self._lock:
+            if (len(self.free_arrays[key]) >= self.max_per_key
+                    or self.pooled_bytes + array.nbytes > self.max_bytes):
+                if not self.free_arrays[key]:
+                    del self.free_arrays[key]
+                return
+            self.free_arrays[key].append(array)
+            self.pooled_bytes += array.nbytes
+
+    def clear(self):
+        '''
+        Drops all pooled arrays.
+        '''
+
+        with self._lock:
+            self.free_arrays.clear()
+            self.pooled_bytes = 0
+
+
+def quantize(values, scale, offset, dtype):
+    '''
+    Returns (values - offset) / scale as dtype. Integer results are rounded and clipped to the dtype's range rather than
+    wrapping around. Raises ValueError if scale is 0 or a NaN would be cast to an integer dtype.
+    '''
+
+    if scale == 0:
+        raise ValueError('Quantization scale must not be 0.')
+
+    values = np.asarray(values)
+    if _is_integer_identity(values, scale, offset, dtype):
+        return _clip_integers(values, dtype)
+    quantized = (values.astype(np.result_type(values, np.float64)) - offset) / scale
+    return _cast_rounded(quantized, dtype)
+
+
+def dequantize(values, scale, offset, dtype):
+    '''
+    Returns values * scale + offset as dtype, undoing quantize. Integer results are rounded and clipped like in
+    quantize.
+    '''
+
+    values = np.asarray(values)
+    if _is_integer_identity(values, scale, offset, dtype):
+        return _clip_integers(values, dtype)
+    dequantized = values.astype(np.result_type(values, np.float64)) * scale + offset
+    return _cast_rounded(dequantized, dtype)
+
+
+def _is_integer_identity(values, scale, offset, dtype):
+    '''
+    Returns True if converting the values to dtype doesn't scale or shift them and both are integers, so the conversion
+    can stay in the integer domain (float64 can't hold every 64-bit integer).
+    '''
+
+    return (scale == 1 and offset == 0 and np.issubdtype(values.dtype, np.integer)
+            and np.issubdtype(dtype, np.integer))
+
+
+def _clip_integers(values, dtype):
+    '''
+    Returns the integer values as the integer dtype, clipped to the dtype's range rather than wrapping around.
+    '''
+
+    #: The bounds are in both types' ranges, so they can be expressed in values' own dtype
+    values_info = np.iinfo(values.dtype)
+    dtype_info = np.iinfo(dtype)
+    lower = np.array(max(values_info.min, dtype_info.min), dtype=values.dtype)
+    upper = np.array(min(values_info.max, dtype_info.max), dtype=values.dtype)
+    return np.clip(values, lower, upper).astype(dtype)
+
+
+def _cast_rounded(values, dtype):
+    '''
+    Returns the float values as dtype, rounding and clipping them to the dtype's range first if it's an integer dtype.
+    Raises ValueError for NaNs, which have no integer equivalent.
+    '''
+
+    if np.issubdtype(dtype, np.integer):
+        if np.isnan(values).any():
+            raise ValueError(f'Can\'t convert NaN to {np.dtype(dtype)}.')
+        dtype_info = np.iinfo(dtype)
+        #: 64-bit maximums round up when converted to float64, which would then wrap around when cast back
+        upper = float(dtype_info.max)
+        if int(upper) > dtype_info.max:
+            upper = np.nextafter(upper, -np.inf)
+        values = np.clip(np.rint(values), float(dtype_info.min), upper)
+    return values.astype(dtype)
+
+
+def block_windows(x_off, y_off, x_size, y_size, block_y, aggregated_reads):
+    '''
+    Yields (x_off, y_off, x_size, y_size) windows covering the given window. Each window spans the full width and
+    aggregated_reads rows of blocks, with boundaries snapped to the source's block rows so no block is read twice.
+    Raises ValueError if aggregated_reads isn't a positive integer.
+    '''
+
+    if isinstance(aggregated_reads, bool) or not isinstance(aggregated_reads, (int, np.integer)) or aggregated_reads < 1:
+        raise ValueError(f'aggregated_reads must be a positive integer, not {aggregated_reads!r}.')
+
+    window_height = block_y * aggregated_reads
+    y_end = y_off + y_size
+    #: First boundary is the next block-aligned row after y_off
+    next_y = (y_off // window_height + 1) * window_height
+    current_y = y_off
+    while current_y < y_end:
+        window_end = min(next_y, y_end)
+        yield x_off, current_y, x_size, window_end - current_y
+        current_y = window_end
+        next_y += window_height
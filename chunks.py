@@ -1,12 +1,298 @@
-from osgeo import gdal
+from osgeo import gdal, gdal_array
 import numpy as np
 import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from chunk_utils import BufferPool, block_windows, dequantize, quantize
+
+#: GDAL < 3.6.4 can crash on multithreaded multi-band GeoTIFF reads (ExtraSamples bug)
+_GDAL_MT_MULTIBAND_SAFE = int(gdal.VersionInfo('VERSION_NUM')) >= 3060400
+
+#: Each thread caches its own dataset handles (see _handle_cache), as GDAL datasets can't be shared between threads
+_THREAD_STATE = threading.local()
+_HANDLE_CACHE_SIZE = 16
+
+#: Shared worker threads for parallel_bands reads, created on first use. Reusing the threads lets each worker keep its
+#: own cached handles between read_chunk calls.
+_BAND_EXECUTOR = None
+_BAND_EXECUTOR_LOCK = threading.Lock()
+
+#: In-memory VRT paths built by read_chunk_mosaic, keyed by their tuple of source paths, in least- to most-recently
+#: used order. Shared by all threads, so only touch it while holding _MOSAIC_VRTS_LOCK.
+_MOSAIC_VRTS = OrderedDict()
+_MOSAIC_VRTS_LOCK = threading.Lock()
+_MOSAIC_VRTS_SIZE = 16
+
+#: Block size for written files
+_WRITE_BLOCK_SIZE = 256
+
+
+@contextmanager
+def _config_option(key, value):
+    '''
+    Temporarily sets the GDAL config option key to value for the calling thread only, restoring the previous value on
+    exit. Other threads, including any GDAL worker threads, don't see the change.
+    '''
+
+    old_value = gdal.GetThreadLocalConfigOption(key)
+    gdal.SetThreadLocalConfigOption(key, value)
+    try:
+        yield
+    finally:
+        gdal.SetThreadLocalConfigOption(key, old_value)
+
+
+def _open(dem_path, num_threads):
+    '''
+    Opens dem_path read-only. If num_threads is specified, GDAL_NUM_THREADS is set to it while opening, as GeoTIFF only
+    picks up its decompression thread count when the dataset is opened. Unlike the NUM_THREADS open option, this works
+    with every driver.
+    '''
+
+    with _config_option('GDAL_NUM_THREADS', str(num_threads)) if num_threads else nullcontext():
+        return gdal.Open(dem_path, gdal.GA_ReadOnly)
+
+
+@contextmanager
+def _closing(dataset):
+    '''
+    Yields dataset and closes it on exit, rather than waiting for the last reference to be garbage collected.
+    '''
+
+    try:
+        yield dataset
+    finally:
+        _close(dataset)
+
+
+def _close(dataset):
+    '''
+    Closes dataset, flushing any pending writes and releasing its file and block cache. Dataset.Close() was added in
+    GDAL 3.8; older versions close when the last reference is dropped.
+    '''
+
+    if dataset is not None and hasattr(dataset, 'Close'):
+        dataset.Close()
+
+
+def _nodata_value(band):
+    '''
+    Returns band's NoData value, or None if it doesn't have one. 64-bit integer bands return it as an int, as
+    GetNoDataValue's float can't hold every 64-bit value.
+    '''
+
+    if band.DataType == getattr(gdal, 'GDT_Int64', None):
+        return band.GetNoDataValueAsInt64()
+    if band.DataType == getattr(gdal, 'GDT_UInt64', None):
+        return band.GetNoDataValueAsUInt64()
+    return band.GetNoDataValue()
+
+
+def _set_nodata_value(band, nodata):
+    '''
+    Sets band's NoData value, using the exact 64-bit integer setters for 64-bit integer bands.
+    '''
+
+    if band.DataType == getattr(gdal, 'GDT_Int64', None):
+        band.SetNoDataValueAsInt64(int(nodata))
+    elif band.DataType == getattr(gdal, 'GDT_UInt64', None):
+        band.SetNoDataValueAsUInt64(int(nodata))
+    else:
+        band.SetNoDataValue(nodata)
+
+
+def _handle_cache():
+    '''
+    Returns the calling thread's cache of open dataset handles and their metadata, keyed by path and thread count, in
+    least- to most-recently used order.
+    '''
+
+    handle_cache = getattr(_THREAD_STATE, 'handle_cache', None)
+    if handle_cache is None:
+        handle_cache = _THREAD_STATE.handle_cache = OrderedDict()
+    return handle_cache
+
+
+def _open_cached(dem_path, num_threads=None):
+    '''
+    Returns a (file_handle, metadata) tuple for dem_path opened with num_threads (see _open), opening it and reading its
+    metadata only on the calling thread's first access. The thread's least recently used handle is closed once it has
+    more than _HANDLE_CACHE_SIZE open.
+    '''
+
+    handle_cache = _handle_cache()
+    key = (dem_path, num_threads)
+    if key in handle_cache:
+        handle_cache.move_to_end(key)
+        return handle_cache[key]
+
+    file_handle = _open(dem_path, num_threads)
+    if file_handle is None:
+        raise IOError(f'Could not open {dem_path}.')
+    s_band = file_handle.GetRasterBand(1)
+    metadata = {
+        'src_cols': file_handle.RasterXSize,
+        'src_rows': file_handle.RasterYSize,
+        'driver': file_handle.GetDriver(),
+        'bands': file_handle.RasterCount,
+        'transform': file_handle.GetGeoTransform(),
+        'projection': file_handle.GetProjection(),
+        'nodata': _nodata_value(s_band),  #: Assumes all bands have same nodata
+        'data_type': s_band.DataType,
+        'block_size': s_band.GetBlockSize(),
+    }
+    s_band = None
+
+    handle_cache[key] = (file_handle, metadata)
+    if len(handle_cache) > _HANDLE_CACHE_SIZE:
+        _, (evicted_handle, _) = handle_cache.popitem(last=False)
+        _close(evicted_handle)
+
+    return file_handle, metadata
+
+
+def clear_handle_cache():
+    '''
+    Closes the calling thread's cached dataset handles. Call this when done reading, or before modifying a file that has
+    been read. Other threads' handles are closed when those threads exit.
+    '''
+
+    handle_cache = _handle_cache()
+    while handle_cache:
+        _, (file_handle, _) = handle_cache.popitem()
+        _close(file_handle)
+
+
+def clear_mosaic_vrts():
+    '''
+    Deletes the in-memory VRTs built by read_chunk_mosaic. These are shared by all threads, so only call this when no
+    thread is reading a mosaic; handles that already have a VRT open keep working.
+    '''
+
+    #: The mosaic VRTs live in /vsimem/, so they have to be deleted explicitly
+    with _MOSAIC_VRTS_LOCK:
+        while _MOSAIC_VRTS:
+            _, vrt_path = _MOSAIC_VRTS.popitem()
+            gdal.Unlink(vrt_path)
+
+
+def clear_buffer_pool():
+    '''
+    Drops the data_array buffers pooled by RasterChunk.release(), for all threads. Buffers still held by chunks aren't
+    affected.
+    '''
+
+    _POOL.clear()
+
+
+def _mosaic_vrt(source_paths):
+    '''
+    Returns the path of an in-memory VRT mosaicking source_paths, building it on first use so later chunks of the same
+    mosaic reuse both the VRT and its cached handle. The least recently used VRT is deleted once more than
+    _MOSAIC_VRTS_SIZE exist.
+    '''
+
+    key = tuple(source_paths)
+    with _MOSAIC_VRTS_LOCK:
+        if key in _MOSAIC_VRTS:
+            _MOSAIC_VRTS.move_to_end(key)
+            return _MOSAIC_VRTS[key]
+
+        vrt_path = f'/vsimem/mosaic_{uuid.uuid4().hex}.vrt'
+        vrt_filehandle = gdal.BuildVRT(vrt_path, list(key))
+        if vrt_filehandle is None:
+            raise IOError(f'Could not build a VRT from {list(key)}.')
+        #: Closing the new dataset writes the VRT out to /vsimem/
+        _close(vrt_filehandle)
+        vrt_filehandle = None
+
+        _MOSAIC_VRTS[key] = vrt_path
+        if len(_MOSAIC_VRTS) > _MOSAIC_VRTS_SIZE:
+            _, evicted_path = _MOSAIC_VRTS.popitem(last=False)
+            gdal.Unlink(evicted_path)
+
+    return vrt_path
+
+
+_POOL = BufferPool()
+
+
+def _gdal_to_np(gdal_type):
+    '''
+    Returns the numpy dtype that matches the GDAL data type gdal_type, so data_array keeps the source's precision rather
+    than the nodata value's.
+    '''
+
+    return np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(gdal_type))
+
+
+def _np_to_gdal(dtype):
+    '''
+    Returns the GDAL data type matching the numpy dtype, or None if GDAL doesn't support it.
+    '''
+
+    return gdal_array.NumericTypeCodeToGDALTypeCode(np.dtype(dtype))
+
+
+def _wrap_in_mem_dataset(array):
+    '''
+    Returns a MEM dataset that uses the memory of the 3-d (bands, rows, cols) array directly, without copying it. array
+    may be a strided view. The dataset's data type is the one matching array's dtype, which may differ from the source
+    file's (eg, CInt16 data is held as complex64). The caller must keep array alive for as long as the dataset is open.
+    '''
+
+    band_offset, line_offset, pixel_offset = array.strides
+    bands, lines, pixels = array.shape
+    open_string = (f'MEM:::DATAPOINTER={hex(array.ctypes.data)},PIXELS={pixels},LINES={lines},BANDS={bands},'
+                   f'DATATYPE={gdal.GetDataTypeName(_np_to_gdal(array.dtype))},PIXELOFFSET={pixel_offset},'
+                   f'LINEOFFSET={line_offset},BANDOFFSET={band_offset}')
+
+    #: GDAL >= 3.10 refuses to open MEM::: strings unless explicitly allowed
+    with _config_option('GDAL_MEM_ENABLE_OPEN', 'YES'):
+        mem_filehandle = gdal.Open(open_string, gdal.GA_Update)
+    if mem_filehandle is None:
+        raise IOError(f'Could not open a MEM dataset over {array.dtype} data_array.')
+
+    return mem_filehandle
+
+
+def _band_executor():
+    '''
+    Returns the shared executor for parallel_bands reads, creating it on first use with one worker per CPU.
+    '''
+
+    global _BAND_EXECUTOR
+    with _BAND_EXECUTOR_LOCK:
+        if _BAND_EXECUTOR is None:
+            _BAND_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='read_band')
+        return _BAND_EXECUTOR
+
+
+def _read_band(dem_path, band, reads):
+    '''
+    Reads band of dem_path into the buffers in reads, a list of (read_args, buf_obj) pairs. Runs on a _band_executor
+    worker, using that worker thread's own cached handle, as GDAL datasets can't be shared between threads. The handle
+    is opened without extra decompression threads, since the bands are already being read in parallel.
+    '''
+
+    file_handle, _ = _open_cached(dem_path)
+    s_band = file_handle.GetRasterBand(band)
+    for read_args, buf_obj in reads:
+        s_band.ReadAsArray(*read_args, buf_obj=buf_obj)
+
 
 class RasterChunk:
     '''
-    Contains the data and associated metadata (driver, projection, etc) for one chunk of a raster file. This chunk can either be the whole file, a subset of the file, or a buffer subset of the whole file. If it is a buffered subset, any areas of the buffer outside the bounds of the original file are filled with np.nan.
+    Contains the data and associated metadata (driver, projection, etc) for one chunk of a raster file. This chunk can either be the whole file, a subset of the file, or a buffer subset of the whole file. If it is a buffered subset, any areas of the buffer outside the bounds of the original file are filled with the file's NoData value, or 0 if it doesn't have one.
     '''
 
+    #: Fixed attribute slots make attribute access in the read/write paths cheaper and chunks smaller
+    __slots__ = ('rows', 'cols', 'buffer', 'data_type', 'driver', 'bands', 'transform', 'projection', 'cell_size',
+                 'nodata', 'data_array', 'scale', 'offset')
 
     def __init__(self):
 
@@ -21,41 +307,102 @@ class RasterChunk:
         self.projection = None
         self.cell_size = None
         self.nodata = None
+        self.data_array = None
+        #: data_array holds (value - offset) / scale
+        self.scale = 1
+        self.offset = 0
 
 
 
-    def read_chunk(self, dem_path, x_start=0, y_start=0, read_x=0, read_y=0, buffer=0):
+    def __array__(self, dtype=None, copy=None):
+        '''
+        Lets numpy (and anything built on np.asarray, like xarray or dask) use data_array without copying it. The
+        returned array references data_array itself, so it stays valid if the chunk reads new data or is released.
+        '''
+
+        if self.data_array is None:
+            raise ValueError('RasterChunk has no data; call read_chunk first (and not after release).')
+        if copy is False and dtype is not None and np.dtype(dtype) != self.data_array.dtype:
+            raise ValueError(f'Converting {self.data_array.dtype} data_array to {np.dtype(dtype)} requires a copy.')
+        if copy:
+            return np.array(self.data_array, dtype=dtype, copy=True)
+        return np.asarray(self.data_array, dtype=dtype)
+
+    def __dlpack__(self, **kwargs):
+        '''
+        Exports data_array via DLPack for zero-copy handoff to torch, cupy, jax, etc. (eg, torch.from_dlpack(chunk)).
+        Device libraries still need to copy the host memory to the device once.
+        '''
+
+        return self.data_array.__dlpack__(**kwargs)
+
+    def __dlpack_device__(self):
+        '''
+        Reports the device data_array lives on (always the CPU).
+        '''
+
+        return self.data_array.__dlpack_device__()
+
+    def read_chunk(self, dem_path, x_start=0, y_start=0, read_x=0, read_y=0, buffer=0, num_threads='ALL_CPUS',
+                   parallel_bands=False, memmap_path=None, aggregated_reads=None, target_dtype=None, scale=1,
+                   offset=0):
         '''
         Read the raster at dem_path. Start from start_x, start_y and read read_x and read_y cols and rows, respectively; if these aren't specified, read the whole file. If buffer is specified, read buffer spaces around the area defined by start_x/start_y by read_x/read_y, filling with nodata if buffer goes beyond the bounds of the raster file.
+
+        num_threads is passed to GDAL as GDAL_NUM_THREADS for the calling thread while the file is opened and read, so compressed sources are decompressed in parallel (GDAL >= 3.6). Use None to leave GDAL's settings alone. num_threads is ignored on GDAL < 3.6.4.
+
+        If parallel_bands is True, multi-band rasters are read one band per thread from a shared pool of one worker per CPU. Each worker caches its own dataset handles across calls, opened without num_threads so the total thread count stays bounded by the CPU count. This helps latency-bound (remote or cold-cache) sources; it falls back to a single read on GDAL < 3.6.4.
+
+        If memmap_path is specified, data_array is backed by a np.memmap scratch file at that path instead of memory, allowing chunks larger than RAM and sharing the data with other processes.
+
+        If aggregated_reads is specified (16 is a good start), the window is read in full-width strips of aggregated_reads block rows, snapped to the source's block boundaries, rather than in one call. This bounds GDAL's working memory on very large windows.
+
+        If target_dtype is specified, data_array is stored as that numpy dtype instead of the source's, quantized as (value - offset) / scale (eg, np.int16 with scale=0.01 keeps cm precision for elevations between -327 and 327 m; pass an offset to shift the range). Any dtype numpy can cast to works, including ml_dtypes.bfloat16. If scale and offset are left alone and GDAL supports target_dtype, GDAL converts the values during the read; otherwise each window is read in the source type and quantized. write_chunk converts the values back to the source type.
         '''
 
         #: Rows = i = y values, cols = j = x values; 0,0 at top left of raster
 
-        file_handle = gdal.Open(dem_path, gdal.GA_ReadOnly)
+        #: Multithreaded multi-band reads can crash older GDALs, and we don't know the band count until it's open
+        if not _GDAL_MT_MULTIBAND_SAFE:
+            num_threads = None
+
+        #: Handle and metadata are cached across calls, so repeated reads of the same file don't reopen it
+        file_handle, metadata = _open_cached(dem_path, num_threads)
+        self.buffer = buffer
+        self.scale = scale
+        self.offset = offset
+        src_cols = metadata['src_cols']
+        src_rows = metadata['src_rows']
 
         #: Set rows/cols to windowed size or the original file's size
         if read_y:
             self.rows = read_y
         else:
-            self.rows = file_handle.RasterYSize
+            self.rows = src_rows
         
         if read_x:
             self.cols = read_x
         else:
-            self.cols = file_handle.RasterXSize
+            self.cols = src_cols
 
 
-        self.driver = file_handle.GetDriver()
-        self.bands = file_handle.RasterCount
-        s_band = file_handle.GetRasterBand(1)
+        self.driver = metadata['driver']
+        self.bands = metadata['bands']
 
         #: Get source georeference info
-        self.transform = file_handle.GetGeoTransform()
-        self.projection = file_handle.GetProjection()
+        self.transform = metadata['transform']
+        self.projection = metadata['projection']
         self.cell_size = abs(self.transform[5])  #: Assumes square pixels where height=width
-        self.nodata = s_band.GetNoDataValue()  #: Assumes all bands have same nodata
-        self.data_type = s_band.DataType
+        self.nodata = metadata['nodata']
+        self.data_type = metadata['data_type']
+
 
+        #: Whole-file reads with no extra options don't need any window or edge math
+        if (not buffer and not x_start and not y_start and self.rows == src_rows and self.cols == src_cols
+                and not parallel_bands and not memmap_path and aggregated_reads is None and target_dtype is None
+                and scale == 1 and offset == 0):
+            self._read_whole(file_handle, num_threads)
+            return
 
         # data_array calculations
         # Non-edge-case values for data_array
@@ -65,70 +412,106 @@ class RasterChunk:
         x_off = x_start - buffer
         y_off = y_start - buffer
 
-        # Values for ReadAsArray, these aren't changed later unelss the border case
-        # checks change them
-        read_x_off = x_off
-        read_y_off = y_off
-        read_x_size = x_size
-        read_y_size = y_size
-
-        # Slice values (of data_array) for copying read_array into data_array,
-        # these aren't changed later unelss the border case checks change them
-        da_x_start = 0
-        da_x_end = x_size
-        da_y_start = 0
-        da_y_end = y_size
-
         # Edge logic
-        # If data_array exceeds bounds of image:
-        #   Adjust x/y offset to appropriate place (for < 0 cases only).
-        #   Reduce read size by buffer (we're not reading that edge area on one side)
-        #   Move start or end value for data_array slice to be -buffer ([:-buffer])
-        # Checks both x and y, setting read and slice values for each dimension if
-        # needed
-        if x_off < 0:
-            read_x_off = 0
-            read_x_size -= buffer
-            da_x_start = buffer
-        if x_off + x_size > file_handle.RasterXSize:
-            read_x_size -= buffer
-            da_x_end = -buffer
-
-        if y_off < 0:
-            read_y_off = 0
-            read_y_size -= buffer
-            da_y_start = buffer
-        if y_off + y_size > file_handle.RasterYSize:
-            read_y_size -= buffer
-            da_y_end = -buffer
-
-        #: Initialize data_array holding superset of actual desired window, initialized to NoData value if present, 0 otherwise.
-        #:  Edge case logic insures edges fill appropriate portion when loaded in
-        if self.nodata or self.nodata == 0:
-            self.data_array = np.full((self.bands, y_size, x_size), self.nodata)
+        # Clamp the read window to the bounds of the image. The slice values (of
+        # data_array) are the clamped window's position relative to the unclamped
+        # one; anything in data_array outside of them lies beyond the image and is
+        # left as NoData. This handles windows that overflow on both sides.
+        read_x_off = max(0, x_off)
+        read_y_off = max(0, y_off)
+        read_x_size = min(src_cols, x_off + x_size) - read_x_off
+        read_y_size = min(src_rows, y_off + y_size) - read_y_off
+
+        da_x_start = read_x_off - x_off
+        da_x_end = da_x_start + read_x_size
+        da_y_start = read_y_off - y_off
+        da_y_end = da_y_start + read_y_size
+
+        #: Initialize data_array holding superset of actual desired window. Only the edge strips that won't be
+        #: overwritten by the read are filled with the NoData value if present, 0 otherwise.
+        np_dtype = np.dtype(target_dtype) if target_dtype is not None else _gdal_to_np(self.data_type)
+        nodata = quantize(self.nodata if self.nodata is not None else 0, scale, offset, np_dtype)
+        if memmap_path:
+            self.data_array = np.memmap(memmap_path, dtype=np_dtype, mode='w+', shape=(self.bands, y_size, x_size))
         else:
-            data_array = np.full((self.bands, y_size, x_size), 0)
-
-        for band in range(1, self.bands + 1):
-
-            s_band = file_handle.GetRasterBand(band)
+            self.data_array = _POOL.acquire((self.bands, y_size, x_size), np_dtype)
+
+        #: Top and bottom strips span the full width; left and right strips only span the rows that are read.
+        #: Non-edge chunks have empty strips, so fill() is skipped for them.
+        data_array = self.data_array
+        edge_strips = (data_array[:, :da_y_start, :],
+                       data_array[:, da_y_end:, :],
+                       data_array[:, da_y_start:da_y_end, :da_x_start],
+                       data_array[:, da_y_start:da_y_end, da_x_end:])
+        for strip in edge_strips:
+            if strip.size:
+                strip.fill(nodata)
+
+        # Master read call. read_ variables have been changed for edge cases if
+        # needed. All bands are read in a single dataset-level call so GDAL can
+        # decompress each block once for pixel-interleaved sources. GDAL reads
+        # straight into the matching slice of our NoData-initialized data_array
+        # (strided views are fine, GDAL uses the view's strides as band/line/pixel
+        # spacing), leaving only the edge strips as NoData.
+        if self.bands > 1 and not _GDAL_MT_MULTIBAND_SAFE:
+            parallel_bands = False
+        #: GDAL can only convert between its own types, and can't apply scale/offset
+        quantize_after_read = (scale != 1 or offset != 0) or _np_to_gdal(np_dtype) is None
+        if quantize_after_read:
+            parallel_bands = False
+
+        if aggregated_reads is not None:
+            block_y = metadata['block_size'][1]
+            windows = block_windows(read_x_off, read_y_off, read_x_size, read_y_size, block_y, aggregated_reads)
+        else:
+            windows = [(read_x_off, read_y_off, read_x_size, read_y_size)]
+
+        #: Pair each source window with the rows of data_array it fills
+        y_shift = da_y_start - read_y_off
+        xs, xe = da_x_start, da_x_start + read_x_size
+        reads = [(window, data_array[:, window[1] + y_shift:window[1] + y_shift + window[3], xs:xe])
+                 for window in windows]
+
+        #: Drivers that check GDAL_NUM_THREADS at read time (eg, Zarr) see it on this thread; GeoTIFF got it when the
+        #: handle was opened
+        with _config_option('GDAL_NUM_THREADS', str(num_threads)) if num_threads else nullcontext():
+            if parallel_bands and self.bands > 1:
+                #: Each band writes to its own disjoint slice of data_array, so no locking is needed
+                executor = _band_executor()
+                futures = [executor.submit(_read_band, dem_path, band,
+                                           [(read_args, buf_obj[band - 1]) for read_args, buf_obj in reads])
+                           for band in range(1, self.bands + 1)]
+                for future in futures:
+                    future.result()
+            elif quantize_after_read:
+                for read_args, buf_obj in reads:
+                    #: Single-band datasets return 2-d arrays, which broadcast into the (1, rows, cols) buf_obj
+                    buf_obj[...] = quantize(file_handle.ReadAsArray(*read_args), scale, offset, np_dtype)
+            else:
+                for read_args, buf_obj in reads:
+                    file_handle.ReadAsArray(*read_args, buf_obj=buf_obj)
+
+    def read_chunk_mosaic(self, vrt_path_or_list, *args, **kwargs):
+        '''
+        Read a chunk from a mosaic of rasters. vrt_path_or_list is either the path to an existing VRT or a list of raster paths, which are mosaicked into an in-memory VRT so GDAL can plan a single read across all of them. The remaining arguments are the same as read_chunk. Because the source is a VRT, write_chunk will write a Geotiff. Call clear_mosaic_vrts() to delete the in-memory VRTs once no thread is reading mosaics.
+        '''
 
-            # Master read call. read_ variables have been changed for edge
-            # cases if needed
-            read_array = s_band.ReadAsArray(read_x_off, read_y_off,
-                                            read_x_size, read_y_size)
-            
-            s_band = None
+        if isinstance(vrt_path_or_list, (str, os.PathLike)):
+            vrt_path = os.fspath(vrt_path_or_list)
+        else:
+            vrt_path = _mosaic_vrt(vrt_path_or_list)
 
-            # The cells of our NoData-intiliazed data_array corresponding to the
-            # read_array are replaced with data from read_array. This changes every
-            # value, except for edge cases that leave portions of the data_array
-            # as NoData.
-            data_array[band, da_y_start:da_y_end, da_x_start:da_x_end] = read_array
+        self.read_chunk(vrt_path, *args, **kwargs)
 
+    def _read_whole(self, file_handle, num_threads):
+        '''
+        Reads every band of file_handle into a new data_array in a single call. Used by read_chunk when the chunk is the
+        whole file, so there are no edges to fill.
+        '''
 
-        # Close source file handle
-        file_handle = None
+        self.data_array = _POOL.acquire((self.bands, self.rows, self.cols), _gdal_to_np(self.data_type))
+        with _config_option('GDAL_NUM_THREADS', str(num_threads)) if num_threads else nullcontext():
+            file_handle.ReadAsArray(buf_obj=self.data_array)
 
     def write_chunk(self, out_path):
         '''
@@ -144,14 +527,59 @@ class RasterChunk:
         if os.path.exists(out_path):
             raise IOError(f'Output file {out_path} already exists.')
 
-        target_filehandle = driver.Create(out_path, self.cols, self.rows, self.bands, self.Datatype, options=['tiled=yes', 'bigtiff=yes'])
-        target_filehandle.SetGeoTransform(self.transform)
-        target_filehandle.SetProjection(self.projection)
-
-        for band in self.bands:
-            t_band = target_filehandle.GetRasterBand(band)
-            t_band.SetNoDataValue(self.nodata)
-            t_band.WriteArray(self.data_array[band])
+        #: Floating point predictor works better than horizontal differencing on float data
+        if self.data_type in (gdal.GDT_Float32, gdal.GDT_Float64):
+            predictor = 3
+        else:
+            predictor = 2
+        options = ['TILED=YES', 'BIGTIFF=IF_SAFER', 'COMPRESS=ZSTD', f'PREDICTOR={predictor}', 'ZSTD_LEVEL=1',
+                   'NUM_THREADS=ALL_CPUS', f'BLOCKXSIZE={_WRITE_BLOCK_SIZE}', f'BLOCKYSIZE={_WRITE_BLOCK_SIZE}']
+
+        #: Wrap the area inside the buffer in a MEM dataset and let GDAL copy it to the target in one call, so the
+        #: tile writing and compression are pipelined in C rather than driven block by block from Python
+        buffer = self.buffer
+        out_array = self.data_array[:, buffer:buffer + self.rows, buffer:buffer + self.cols]
+
+        #: Undo any quantization from read_chunk, restoring the exact NoData value
+        np_dtype = _gdal_to_np(self.data_type)
+        if self.scale != 1 or self.offset != 0 or out_array.dtype != np_dtype:
+            quantized_array = out_array
+            out_array = dequantize(quantized_array, self.scale, self.offset, np_dtype)
+            if self.nodata is not None:
+                quantized_nodata = quantize(self.nodata, self.scale, self.offset, quantized_array.dtype)
+                out_array[quantized_array == quantized_nodata] = self.nodata
+            quantized_array = None
+        with _closing(_wrap_in_mem_dataset(out_array)) as mem_filehandle:
+            mem_filehandle.SetGeoTransform(self.transform)
+            mem_filehandle.SetProjection(self.projection)
+            if self.nodata is not None:
+                for band in range(1, self.bands + 1):
+                    _set_nodata_value(mem_filehandle.GetRasterBand(band), self.nodata)
+
+            #: CreateCopy keeps the MEM dataset's data type, so data types numpy can't hold natively (eg, CInt16
+            #: held as complex64) are converted back to the source's through Translate instead
+            if _np_to_gdal(out_array.dtype) == self.data_type:
+                target_filehandle = driver.CreateCopy(out_path, mem_filehandle, options=options)
+            else:
+                target_filehandle = gdal.Translate(out_path, mem_filehandle, format=driver.ShortName,
+                                                   outputType=self.data_type, creationOptions=options)
+            if target_filehandle is None:
+                raise IOError(f'Could not create {out_path} with {driver.ShortName} options {options}.')
+            with _closing(target_filehandle):
+                #: Make sure all compressed blocks are on disk before we return
+                target_filehandle.FlushCache()
+
+        out_array = None
+
+        #: Push any pending writes to a memmap-backed data_array out to its scratch file
+        if isinstance(self.data_array, np.memmap):
+            self.data_array.flush()
+
+    def release(self):
+        '''
+        Returns data_array to the shared buffer pool for reuse by later chunks of the same shape. Call this after write_chunk once the chunk's data is no longer needed. Any arrays or DLPack tensors taken from the chunk earlier (eg, np.asarray(chunk)) share data_array's memory, so they will see the next chunk's data once it is reused; copy them first if they need to outlive the chunk.
+        '''
 
-        t_band = None
-        target_filehandle = None
\ No newline at end of file
+        if self.data_array is not None and not isinstance(self.data_array, np.memmap):
+            _POOL.release(self.data_array)
+        self.data_array = None
@@ -0,0 +1,3 @@
+'''
+Puts the repository root on sys.path so the tests can import chunks and chunk_utils when run with plain pytest.
+'''
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from chunk_utils import BufferPool, block_windows, dequantize, quantize
+
+
+@pytest.mark.parametrize('scale', [0.3, 2.0])
+def test_quantize_round_trip_is_within_half_a_step(scale):
+    values = np.arange(60000, dtype=np.uint16)
+
+    restored = dequantize(quantize(values, scale, 0, np.int32), scale, 0, np.uint16)
+
+    assert restored.dtype == np.uint16
+    assert np.abs(restored.astype(np.int64) - values).max() <= scale / 2
+
+
+def test_dequantize_clips_to_integer_range():
+    dequantized = dequantize(np.array([-10, 70000], dtype=np.int32), 1, 0, np.uint16)
+
+    np.testing.assert_array_equal(dequantized, [0, 65535])
+
+
+def test_quantize_rejects_zero_scale():
+    with pytest.raises(ValueError):
+        quantize(np.ones(3, dtype=np.float32), 0, 0, np.int16)
+
+
+def test_quantize_rejects_nan_for_integer_dtype():
+    with pytest.raises(ValueError):
+        quantize(np.nan, 0.01, 0, np.int16)
+
+
+def test_buffer_pool_reuses_released_arrays():
+    pool = BufferPool()
+    array = pool.acquire((1, 4, 4), np.float32)
+    pool.release(array)
+
+    assert pool.acquire((1, 4, 4), np.float32) is array
+    assert pool.pooled_bytes == 0
+
+
+def test_buffer_pool_drops_arrays_beyond_its_limits():
+    pool = BufferPool(max_per_key=1, max_bytes=100)
+
+    pool.release(np.empty(10, dtype=np.uint8))
+    pool.release(np.empty(10, dtype=np.uint8))
+    pool.release(np.empty(200, dtype=np.uint8))
+
+    assert len(pool.free_arrays[((10,), np.dtype(np.uint8))]) == 1
+    assert pool.pooled_bytes == 10
+
+
+def test_block_windows_snap_to_block_rows():
+    windows = list(block_windows(5, 3, 10, 70, 8, 2))
+
+    assert windows == [(5, 3, 10, 13), (5, 16, 10, 16), (5, 32, 10, 16), (5, 48, 10, 16), (5, 64, 10, 9)]
+
+
+def test_quantize_clips_large_floats_to_64_bit_range():
+    assert quantize(1e19, 1, 0, np.int64) > 0
+    assert quantize(-1e19, 1, 0, np.int64) < 0
+    assert quantize(1e20, 1, 0, np.uint64) > 0
+
+
+def test_quantize_keeps_64_bit_integers_exact():
+    assert quantize(2 ** 64 - 1, 1, 0, np.uint64) == 2 ** 64 - 1
+    assert quantize(np.int64(2 ** 63 - 1), 1, 0, np.int64) == 2 ** 63 - 1
+    assert dequantize(np.array([2 ** 64 - 1], dtype=np.uint64), 1, 0, np.int64)[0] == 2 ** 63 - 1
+
+
+def test_quantize_clips_integers_to_a_narrower_dtype():
+    np.testing.assert_array_equal(quantize(np.array([-5, 300], dtype=np.int64), 1, 0, np.uint8), [0, 255])
+
+
+@pytest.mark.parametrize('aggregated_reads', [0, -1, 1.5, True])
+def test_block_windows_rejects_non_positive_integers(aggregated_reads):
+    with pytest.raises(ValueError):
+        list(block_windows(0, 0, 10, 10, 8, aggregated_reads))
@@ -0,0 +1,197 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo')
+
+from osgeo import gdal
+
+from chunks import RasterChunk, clear_handle_cache, clear_mosaic_vrts
+
+
+@pytest.fixture(autouse=True)
+def _close_handles():
+    yield
+    clear_handle_cache()
+    clear_mosaic_vrts()
+
+
+def _write_tif(path, data, gdal_type=gdal.GDT_Float32, nodata=None, origin=(0, 0)):
+    '''
+    Writes the 3-d (bands, rows, cols) data to a tiled GeoTIFF at path with 1-unit cells and returns path as a str.
+    '''
+
+    bands, rows, cols = data.shape
+    target_filehandle = gdal.GetDriverByName('GTiff').Create(
+        str(path), cols, rows, bands, gdal_type, options=['TILED=YES', 'BLOCKXSIZE=16', 'BLOCKYSIZE=16'])
+    target_filehandle.SetGeoTransform((origin[0], 1, 0, origin[1], 0, -1))
+    for band in range(1, bands + 1):
+        t_band = target_filehandle.GetRasterBand(band)
+        if nodata is not None:
+            t_band.SetNoDataValue(nodata)
+        t_band.WriteArray(data[band - 1])
+    t_band = None
+    target_filehandle = None
+
+    return str(path)
+
+
+def _read_tif(path):
+    '''
+    Returns the (bands, rows, cols) data, GDAL data type and band 1 NoData value of the raster at path.
+    '''
+
+    file_handle = gdal.Open(str(path))
+    data = file_handle.ReadAsArray().reshape(file_handle.RasterCount, file_handle.RasterYSize, file_handle.RasterXSize)
+    s_band = file_handle.GetRasterBand(1)
+    data_type, nodata = s_band.DataType, s_band.GetNoDataValue()
+    s_band = None
+    file_handle = None
+
+    return data, data_type, nodata
+
+
+def _random_data(shape, dtype=np.float32):
+    return np.random.default_rng(0).integers(0, 1000, size=shape).astype(dtype)
+
+
+def _chunk_with(data_array):
+    chunk = RasterChunk()
+    chunk.data_array = data_array
+    return chunk
+
+
+def test_asarray_outlives_data_array_replacement():
+    original = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+    chunk = _chunk_with(original.copy())
+
+    shared = np.asarray(chunk)
+    chunk.data_array = np.zeros_like(original)
+
+    assert shared.base is not chunk
+    np.testing.assert_array_equal(shared, original)
+
+
+def test_asarray_does_not_copy():
+    chunk = _chunk_with(np.ones((1, 2, 2), dtype=np.int16))
+
+    assert np.shares_memory(np.asarray(chunk), chunk.data_array)
+
+
+def test_array_copy_false_rejects_dtype_change():
+    chunk = _chunk_with(np.ones((1, 2, 2), dtype=np.int16))
+
+    with pytest.raises(ValueError):
+        np.asarray(chunk, dtype=np.float32, copy=False)
+
+
+def test_asarray_rejects_chunk_without_data():
+    with pytest.raises(ValueError):
+        np.asarray(RasterChunk())
+
+
+def test_read_whole_file(tmp_path):
+    data = _random_data((1, 30, 40))
+    dem_path = _write_tif(tmp_path / 'dem.tif', data)
+
+    chunk = RasterChunk()
+    chunk.read_chunk(dem_path)
+
+    assert (chunk.rows, chunk.cols, chunk.bands) == (30, 40, 1)
+    assert chunk.data_array.dtype == np.float32
+    np.testing.assert_array_equal(chunk.data_array, data)
+
+
+def test_buffered_corner_chunk_fills_nodata_strips_and_writes_inner_area(tmp_path):
+    data = _random_data((1, 30, 40))
+    dem_path = _write_tif(tmp_path / 'dem.tif', data, nodata=-9999)
+
+    chunk = RasterChunk()
+    chunk.read_chunk(dem_path, x_start=0, y_start=0, read_x=10, read_y=10, buffer=3)
+
+    assert chunk.data_array.shape == (1, 16, 16)
+    assert (chunk.data_array[:, :3, :] == -9999).all()
+    assert (chunk.data_array[:, :, :3] == -9999).all()
+    np.testing.assert_array_equal(chunk.data_array[:, 3:, 3:], data[:, :13, :13])
+
+    #: The inner area is a strided view of data_array, which write_chunk hands to GDAL without copying
+    out_path = tmp_path / 'out.tif'
+    chunk.write_chunk(str(out_path))
+    written, data_type, nodata = _read_tif(out_path)
+    np.testing.assert_array_equal(written, data[:, :10, :10])
+    assert data_type == gdal.GDT_Float32
+    assert nodata == -9999
+
+
+def test_window_overflowing_both_sides_fills_zero_without_nodata(tmp_path):
+    data = _random_data((1, 10, 10), np.int16)
+    dem_path = _write_tif(tmp_path / 'dem.tif', data, gdal_type=gdal.GDT_Int16)
+
+    chunk = RasterChunk()
+    chunk.read_chunk(dem_path, read_x=10, read_y=10, buffer=2)
+
+    assert chunk.data_array.shape == (1, 14, 14)
+    assert chunk.data_array.dtype == np.int16
+    np.testing.assert_array_equal(chunk.data_array[:, 2:12, 2:12], data)
+    inner_mask = np.zeros((14, 14), dtype=bool)
+    inner_mask[2:12, 2:12] = True
+    assert (chunk.data_array[:, ~inner_mask] == 0).all()
+
+
+def test_multi_band_read_modes_match(tmp_path):
+    data = _random_data((3, 48, 64), np.int16)
+    dem_path = _write_tif(tmp_path / 'dem.tif', data, gdal_type=gdal.GDT_Int16)
+    window = dict(x_start=5, y_start=7, read_x=30, read_y=20, buffer=4)
+
+    single = RasterChunk()
+    single.read_chunk(dem_path, **window)
+    parallel = RasterChunk()
+    parallel.read_chunk(dem_path, parallel_bands=True, **window)
+    aggregated = RasterChunk()
+    aggregated.read_chunk(dem_path, aggregated_reads=1, **window)
+
+    np.testing.assert_array_equal(single.data_array, data[:, 3:31, 1:39])
+    np.testing.assert_array_equal(parallel.data_array, single.data_array)
+    np.testing.assert_array_equal(aggregated.data_array, single.data_array)
+
+    out_path = tmp_path / 'out.tif'
+    single.write_chunk(str(out_path))
+    written, data_type, _ = _read_tif(out_path)
+    np.testing.assert_array_equal(written, data[:, 7:27, 5:35])
+    assert data_type == gdal.GDT_Int16
+
+
+def test_quantized_read_round_trips_through_write_chunk(tmp_path):
+    data = (_random_data((1, 20, 20)) * 0.25).astype(np.float32)
+    data[0, 5, 5] = -9999
+    dem_path = _write_tif(tmp_path / 'dem.tif', data, nodata=-9999)
+
+    chunk = RasterChunk()
+    chunk.read_chunk(dem_path, target_dtype=np.int16, scale=0.01)
+
+    assert chunk.data_array.dtype == np.int16
+    out_path = tmp_path / 'out.tif'
+    chunk.write_chunk(str(out_path))
+    written, data_type, nodata = _read_tif(out_path)
+
+    assert data_type == gdal.GDT_Float32
+    assert nodata == -9999
+    assert written[0, 5, 5] == -9999
+    np.testing.assert_allclose(written, data, atol=0.0051)
+
+
+def test_two_tile_mosaic(tmp_path):
+    data = _random_data((1, 10, 40))
+    left_path = _write_tif(tmp_path / 'left.tif', data[:, :, :20], origin=(0, 10))
+    right_path = _write_tif(tmp_path / 'right.tif', data[:, :, 20:], origin=(20, 10))
+
+    whole = RasterChunk()
+    whole.read_chunk_mosaic([left_path, right_path])
+    straddling = RasterChunk()
+    straddling.read_chunk_mosaic([left_path, right_path], x_start=15, y_start=2, read_x=10, read_y=5)
+
+    np.testing.assert_array_equal(whole.data_array, data)
+    np.testing.assert_array_equal(straddling.data_array, data[:, 2:7, 15:25])
+
+    out_path = tmp_path / 'out.tif'
+    straddling.write_chunk(str(out_path))
+    assert gdal.Open(str(out_path)).GetDriver().ShortName == 'GTiff'